@@ -1,7 +1,12 @@
 // version: 0.0.6
 // author: Floris Laporte
 
+#include <algorithm>
+#include <cstdint>
 #include <iostream>
+#include <list>
+#include <memory>
+#include <mutex>
 #include <vector>
 
 #include <klu.h>
@@ -9,6 +14,91 @@
 
 namespace py = pybind11;
 
+// NOTE: the solve functions below are XLA custom call targets. XLA invokes
+// them from compiled code without holding the GIL, hence they should never
+// touch Python objects. Apart from the (mutex guarded) cache of symbolic
+// factorizations, all KLU state is local to each call, which makes them safe
+// to run concurrently from multiple threads.
+
+// cache of KLU symbolic factorizations, keyed by the CSC sparsity pattern
+struct SymbolicCacheEntry {
+  uint64_t key;
+  std::vector<int> Bp;
+  std::vector<int> Bi;
+  std::shared_ptr<klu_symbolic> Symbolic;
+};
+
+const size_t SYMBOLIC_CACHE_SIZE = 16;
+std::list<SymbolicCacheEntry> symbolic_cache; // most recently used first
+std::mutex symbolic_cache_mutex;
+
+uint64_t sparsity_pattern_hash(int n_col, int Anz, int *Bp, int *Bi) {
+  // FNV-1a hash of the CSC sparsity pattern
+  uint64_t hash = 14695981039346656037ULL;
+  auto update = [&hash](int value) {
+    hash ^= static_cast<uint32_t>(value);
+    hash *= 1099511628211ULL;
+  };
+  update(n_col);
+  for (int j = 0; j <= n_col; j++) {
+    update(Bp[j]);
+  }
+  for (int k = 0; k < Anz; k++) {
+    update(Bi[k]);
+  }
+  return hash;
+}
+
+void free_symbolic(klu_symbolic *Symbolic) {
+  klu_common Common;
+  klu_defaults(&Common);
+  klu_free_symbolic(&Symbolic, &Common);
+}
+
+std::shared_ptr<klu_symbolic> analyze(int n_col, int Anz, int *Bp, int *Bi,
+                                      klu_common *Common) {
+  // return the cached symbolic factorization for this sparsity pattern or
+  // compute (and cache) it with klu_analyze.
+  uint64_t key = sparsity_pattern_hash(n_col, Anz, Bp, Bi);
+  {
+    std::lock_guard<std::mutex> lock(symbolic_cache_mutex);
+    for (auto it = symbolic_cache.begin(); it != symbolic_cache.end(); it++) {
+      // compare the full pattern to rule out hash collisions
+      if (it->key == key && it->Bp.size() == (size_t)(n_col + 1) &&
+          it->Bi.size() == (size_t)Anz &&
+          std::equal(it->Bp.begin(), it->Bp.end(), Bp) &&
+          std::equal(it->Bi.begin(), it->Bi.end(), Bi)) {
+        symbolic_cache.splice(symbolic_cache.begin(), symbolic_cache, it);
+        return it->Symbolic;
+      }
+    }
+  }
+
+  std::shared_ptr<klu_symbolic> Symbolic(klu_analyze(n_col, Bp, Bi, Common),
+                                         free_symbolic);
+  if (!Symbolic) {
+    return Symbolic; // don't cache failed analyses
+  }
+
+  std::lock_guard<std::mutex> lock(symbolic_cache_mutex);
+  symbolic_cache.push_front({key, std::vector<int>(Bp, Bp + n_col + 1),
+                             std::vector<int>(Bi, Bi + Anz), Symbolic});
+  if (symbolic_cache.size() > SYMBOLIC_CACHE_SIZE) {
+    symbolic_cache.pop_back();
+  }
+  return Symbolic;
+}
+
+void clear_symbolic_cache() {
+  std::lock_guard<std::mutex> lock(symbolic_cache_mutex);
+  symbolic_cache.clear();
+}
+
+size_t symbolic_cache_size() {
+  std::lock_guard<std::mutex> lock(symbolic_cache_mutex);
+  return symbolic_cache.size();
+}
+
 void coo_to_csc_analyze(int n_col, int n_nz, int *Ai, int *Aj, int *Bi, int *Bp,
                         int *Bk) {
 
@@ -45,121 +135,249 @@ void coo_to_csc_analyze(int n_col, int n_nz, int *Ai, int *Aj, int *Bi, int *Bp,
   }
 }
 
-void solve_f64(void *out, void **in) {
-  // get args
-  int n_col = *reinterpret_cast<int *>(in[0]);
-  int n_lhs = *reinterpret_cast<int *>(in[1]);
-  int n_rhs = *reinterpret_cast<int *>(in[2]);
-  int Anz = *reinterpret_cast<int *>(in[3]);
-  int *Ai = reinterpret_cast<int *>(in[4]);
-  int *Aj = reinterpret_cast<int *>(in[5]);
-  double *Ax = reinterpret_cast<double *>(in[6]);
-  double *b = reinterpret_cast<double *>(in[7]);
-  double *result = reinterpret_cast<double *>(out);
+void solve_f64_worker(int n_col, int n_lhs, int n_lhs_b, int n_rhs, int Anz,
+                      int *Bp, int *Bi, int *Bk, double *Ax, double *b,
+                      double *result, bool transpose) {
+  // NOTE: Bk are the Ax -> Bx (COO -> CSC) transformation indices. If Bk is
+  // a nullptr, Ax is assumed to be in CSC order already.
+  // NOTE: if transpose is true, A^T x = b is solved instead of A x = b.
 
-  // copy b into result
-  for (int i = 0; i < n_lhs * n_col * n_rhs; i++) {
-    result[i] = b[i];
+  // copy b into result (reusing the same b for each lhs if b is shared)
+  for (int i = 0; i < n_lhs; i++) {
+    int n = i * n_rhs * n_col;
+    int nb = (i % n_lhs_b) * n_rhs * n_col;
+    for (int j = 0; j < n_rhs * n_col; j++) {
+      result[n + j] = b[nb + j];
+    }
   }
 
-  // get COO -> CSC transformation information
-  int *Bk = new int[Anz](); // Ax -> Bx transformation indices
-  int *Bi = new int[Anz]();
-  int *Bp = new int[n_col + 1]();
-  coo_to_csc_analyze(n_col, Anz, Ai, Aj, Bi, Bp, Bk);
-
   // initialize KLU for given sparsity pattern
-  klu_symbolic *Symbolic;
+  // NOTE: the symbolic analysis is done only once and shared by all elements
+  // in the batch, as they all have the same sparsity pattern. It is also
+  // reused across calls with the same sparsity pattern.
   klu_numeric *Numeric;
   klu_common Common;
   klu_defaults(&Common);
-  Symbolic = klu_analyze(n_col, Bp, Bi, &Common);
+  std::shared_ptr<klu_symbolic> Symbolic = analyze(n_col, Anz, Bp, Bi, &Common);
 
-  // solve for other elements in batch:
-  // NOTE: same sparsity pattern for each element in batch assumed
-  double *Bx = new double[Anz]();
+  // solve for each element in batch:
+  double *Bx = Bk ? new double[Anz]() : nullptr;
   for (int i = 0; i < n_lhs; i++) {
     int m = i * Anz;
     int n = i * n_rhs * n_col;
 
     // convert COO Ax to CSC Bx
-    for (int k = 0; k < Anz; k++) {
-      Bx[k] = Ax[m + Bk[k]];
+    double *Cx = &Ax[m];
+    if (Bk) {
+      for (int k = 0; k < Anz; k++) {
+        Bx[k] = Ax[m + Bk[k]];
+      }
+      Cx = Bx;
     }
 
     // solve using KLU
-    Numeric = klu_factor(Bp, Bi, Bx, Symbolic, &Common);
-    klu_solve(Symbolic, Numeric, n_col, n_rhs, &result[n], &Common);
+    Numeric = klu_factor(Bp, Bi, Cx, Symbolic.get(), &Common);
+    if (transpose) {
+      klu_tsolve(Symbolic.get(), Numeric, n_col, n_rhs, &result[n], &Common);
+    } else {
+      klu_solve(Symbolic.get(), Numeric, n_col, n_rhs, &result[n], &Common);
+    }
+    klu_free_numeric(&Numeric, &Common);
   }
 
   // clean up
-  klu_free_symbolic(&Symbolic, &Common);
-  klu_free_numeric(&Numeric, &Common);
+  delete[] Bx;
 }
 
-void solve_c128(void *out, void **in) {
-  // get args
-  int n_col = *reinterpret_cast<int *>(in[0]);
-  int n_lhs = *reinterpret_cast<int *>(in[1]);
-  int n_rhs = *reinterpret_cast<int *>(in[2]);
-  int Anz = *reinterpret_cast<int *>(in[3]);
-  int *Ai = reinterpret_cast<int *>(in[4]);
-  int *Aj = reinterpret_cast<int *>(in[5]);
-  double *Ax = reinterpret_cast<double *>(in[6]);
-  double *b = reinterpret_cast<double *>(in[7]);
-  double *result = reinterpret_cast<double *>(out);
+void solve_c128_worker(int n_col, int n_lhs, int n_lhs_b, int n_rhs, int Anz,
+                       int *Bp, int *Bi, int *Bk, double *Ax, double *b,
+                       double *result, bool transpose) {
+  // NOTE: Bk are the Ax -> Bx (COO -> CSC) transformation indices. If Bk is
+  // a nullptr, Ax is assumed to be in CSC order already.
+  // NOTE: if transpose is true, A^T x = b is solved instead of A x = b.
 
-  // copy b into result
-  for (int i = 0; i < 2 * n_lhs * n_col * n_rhs; i++) {
-    result[i] = b[i];
+  // copy b into result (reusing the same b for each lhs if b is shared)
+  for (int i = 0; i < n_lhs; i++) {
+    int n = 2 * i * n_rhs * n_col;
+    int nb = 2 * (i % n_lhs_b) * n_rhs * n_col;
+    for (int j = 0; j < 2 * n_rhs * n_col; j++) {
+      result[n + j] = b[nb + j];
+    }
   }
 
-  // get COO -> CSC transformation information
-  int *Bk = new int[Anz]();       // Ax -> Bx transformation indices
-  int *Bi = new int[Anz]();       // CSC row indices
-  int *Bp = new int[n_col + 1](); // CSC column pointers
-  coo_to_csc_analyze(n_col, Anz, Ai, Aj, Bi, Bp, Bk);
-
   // initialize KLU for given sparsity pattern
-  klu_symbolic *Symbolic;
+  // NOTE: the symbolic analysis is done only once and shared by all elements
+  // in the batch, as they all have the same sparsity pattern. It is also
+  // reused across calls with the same sparsity pattern.
   klu_numeric *Numeric;
   klu_common Common;
   klu_defaults(&Common);
-  Symbolic = klu_analyze(n_col, Bp, Bi, &Common);
+  std::shared_ptr<klu_symbolic> Symbolic = analyze(n_col, Anz, Bp, Bi, &Common);
 
-  // solve for other elements in batch:
-  // NOTE: same sparsity pattern for each element in batch assumed
-  double *Bx = new double[2 * Anz]();
+  // solve for each element in batch:
+  double *Bx = Bk ? new double[2 * Anz]() : nullptr;
   for (int i = 0; i < n_lhs; i++) {
     int m = 2 * i * Anz;
     int n = 2 * i * n_rhs * n_col;
 
     // convert COO Ax to CSC Bx
-    for (int k = 0; k < Anz; k++) {
-      Bx[2 * k] = Ax[m + 2 * Bk[k]];
-      Bx[2 * k + 1] = Ax[m + 2 * Bk[k] + 1];
+    double *Cx = &Ax[m];
+    if (Bk) {
+      for (int k = 0; k < Anz; k++) {
+        Bx[2 * k] = Ax[m + 2 * Bk[k]];
+        Bx[2 * k + 1] = Ax[m + 2 * Bk[k] + 1];
+      }
+      Cx = Bx;
     }
 
     // solve using KLU
-    Numeric = klu_z_factor(Bp, Bi, Bx, Symbolic, &Common);
-    klu_z_solve(Symbolic, Numeric, n_col, n_rhs, &result[n], &Common);
+    Numeric = klu_z_factor(Bp, Bi, Cx, Symbolic.get(), &Common);
+    if (transpose) { // plain (non-conjugate) transpose: conj_solve = 0
+      klu_z_tsolve(Symbolic.get(), Numeric, n_col, n_rhs, &result[n], 0,
+                   &Common);
+    } else {
+      klu_z_solve(Symbolic.get(), Numeric, n_col, n_rhs, &result[n], &Common);
+    }
+    klu_z_free_numeric(&Numeric, &Common);
   }
 
   // clean up
-  klu_free_symbolic(&Symbolic, &Common);
-  klu_free_numeric(&Numeric, &Common);
+  delete[] Bx;
+}
+
+void solve_f64_impl(void *out, void **in, bool transpose) {
+  // get args
+  int n_col = *reinterpret_cast<int *>(in[0]);
+  int n_lhs = *reinterpret_cast<int *>(in[1]);
+  int n_lhs_b = *reinterpret_cast<int *>(in[2]); // 1 if b is shared
+  int n_rhs = *reinterpret_cast<int *>(in[3]);
+  int Anz = *reinterpret_cast<int *>(in[4]);
+  int *Ai = reinterpret_cast<int *>(in[5]);
+  int *Aj = reinterpret_cast<int *>(in[6]);
+  double *Ax = reinterpret_cast<double *>(in[7]);
+  double *b = reinterpret_cast<double *>(in[8]);
+  double *result = reinterpret_cast<double *>(out);
+
+  // get COO -> CSC transformation information
+  int *Bk = new int[Anz]();       // Ax -> Bx transformation indices
+  int *Bi = new int[Anz]();       // CSC row indices
+  int *Bp = new int[n_col + 1](); // CSC column pointers
+  coo_to_csc_analyze(n_col, Anz, Ai, Aj, Bi, Bp, Bk);
+
+  solve_f64_worker(n_col, n_lhs, n_lhs_b, n_rhs, Anz, Bp, Bi, Bk, Ax, b,
+                   result, transpose);
+
+  // clean up
+  delete[] Bk;
+  delete[] Bi;
+  delete[] Bp;
+}
+
+void solve_c128_impl(void *out, void **in, bool transpose) {
+  // get args
+  int n_col = *reinterpret_cast<int *>(in[0]);
+  int n_lhs = *reinterpret_cast<int *>(in[1]);
+  int n_lhs_b = *reinterpret_cast<int *>(in[2]); // 1 if b is shared
+  int n_rhs = *reinterpret_cast<int *>(in[3]);
+  int Anz = *reinterpret_cast<int *>(in[4]);
+  int *Ai = reinterpret_cast<int *>(in[5]);
+  int *Aj = reinterpret_cast<int *>(in[6]);
+  double *Ax = reinterpret_cast<double *>(in[7]);
+  double *b = reinterpret_cast<double *>(in[8]);
+  double *result = reinterpret_cast<double *>(out);
+
+  // get COO -> CSC transformation information
+  int *Bk = new int[Anz]();       // Ax -> Bx transformation indices
+  int *Bi = new int[Anz]();       // CSC row indices
+  int *Bp = new int[n_col + 1](); // CSC column pointers
+  coo_to_csc_analyze(n_col, Anz, Ai, Aj, Bi, Bp, Bk);
+
+  solve_c128_worker(n_col, n_lhs, n_lhs_b, n_rhs, Anz, Bp, Bi, Bk, Ax, b,
+                    result, transpose);
+
+  // clean up
+  delete[] Bk;
+  delete[] Bi;
+  delete[] Bp;
+}
+
+void solve_csc_f64_impl(void *out, void **in, bool transpose) {
+  // get args
+  int n_col = *reinterpret_cast<int *>(in[0]);
+  int n_lhs = *reinterpret_cast<int *>(in[1]);
+  int n_lhs_b = *reinterpret_cast<int *>(in[2]); // 1 if b is shared
+  int n_rhs = *reinterpret_cast<int *>(in[3]);
+  int Anz = *reinterpret_cast<int *>(in[4]);
+  int *Ap = reinterpret_cast<int *>(in[5]); // CSC column pointers
+  int *Ai = reinterpret_cast<int *>(in[6]); // CSC row indices
+  double *Ax = reinterpret_cast<double *>(in[7]);
+  double *b = reinterpret_cast<double *>(in[8]);
+  double *result = reinterpret_cast<double *>(out);
+
+  solve_f64_worker(n_col, n_lhs, n_lhs_b, n_rhs, Anz, Ap, Ai, nullptr, Ax, b,
+                   result, transpose);
+}
+
+void solve_csc_c128_impl(void *out, void **in, bool transpose) {
+  // get args
+  int n_col = *reinterpret_cast<int *>(in[0]);
+  int n_lhs = *reinterpret_cast<int *>(in[1]);
+  int n_lhs_b = *reinterpret_cast<int *>(in[2]); // 1 if b is shared
+  int n_rhs = *reinterpret_cast<int *>(in[3]);
+  int Anz = *reinterpret_cast<int *>(in[4]);
+  int *Ap = reinterpret_cast<int *>(in[5]); // CSC column pointers
+  int *Ai = reinterpret_cast<int *>(in[6]); // CSC row indices
+  double *Ax = reinterpret_cast<double *>(in[7]);
+  double *b = reinterpret_cast<double *>(in[8]);
+  double *result = reinterpret_cast<double *>(out);
+
+  solve_c128_worker(n_col, n_lhs, n_lhs_b, n_rhs, Anz, Ap, Ai, nullptr, Ax, b,
+                    result, transpose);
+}
+
+void solve_f64(void *out, void **in) {
+  solve_f64_impl(out, in, false);
+}
+
+void solve_f64_t(void *out, void **in) {
+  solve_f64_impl(out, in, true);
+}
+
+void solve_c128(void *out, void **in) {
+  solve_c128_impl(out, in, false);
+}
+
+void solve_c128_t(void *out, void **in) {
+  solve_c128_impl(out, in, true);
+}
+
+void solve_csc_f64(void *out, void **in) {
+  solve_csc_f64_impl(out, in, false);
+}
+
+void solve_csc_f64_t(void *out, void **in) {
+  solve_csc_f64_impl(out, in, true);
+}
+
+void solve_csc_c128(void *out, void **in) {
+  solve_csc_c128_impl(out, in, false);
+}
+
+void solve_csc_c128_t(void *out, void **in) {
+  solve_csc_c128_impl(out, in, true);
 }
 
 void coo_mul_vec_f64(void *out, void **in) {
   // get args
   int n_col = *reinterpret_cast<int *>(in[0]);
   int n_lhs = *reinterpret_cast<int *>(in[1]);
-  int n_rhs = *reinterpret_cast<int *>(in[2]);
-  int Anz = *reinterpret_cast<int *>(in[3]);
-  int *Ai = reinterpret_cast<int *>(in[4]);
-  int *Aj = reinterpret_cast<int *>(in[5]);
-  double *Ax = reinterpret_cast<double *>(in[6]);
-  double *b = reinterpret_cast<double *>(in[7]);
+  int n_lhs_b = *reinterpret_cast<int *>(in[2]); // 1 if b is shared
+  int n_rhs = *reinterpret_cast<int *>(in[3]);
+  int Anz = *reinterpret_cast<int *>(in[4]);
+  int *Ai = reinterpret_cast<int *>(in[5]);
+  int *Aj = reinterpret_cast<int *>(in[6]);
+  double *Ax = reinterpret_cast<double *>(in[7]);
+  double *b = reinterpret_cast<double *>(in[8]);
   double *result = reinterpret_cast<double *>(out);
 
   // initialize empty result
@@ -171,9 +389,10 @@ void coo_mul_vec_f64(void *out, void **in) {
   for (int i = 0; i < n_lhs; i++) {
     int m = i * Anz;
     int n = i * n_rhs * n_col;
+    int nb = (i % n_lhs_b) * n_rhs * n_col;
     for (int j = 0; j < n_rhs; j++) {
       for (int k = 0; k < Anz; k++) {
-        result[n + Ai[k] + j * n_col] += Ax[m + k] * b[n + Aj[k] + j * n_col];
+        result[n + Ai[k] + j * n_col] += Ax[m + k] * b[nb + Aj[k] + j * n_col];
       }
     }
   }
@@ -183,12 +402,13 @@ void coo_mul_vec_c128(void *out, void **in) {
   // get args
   int n_col = *reinterpret_cast<int *>(in[0]);
   int n_lhs = *reinterpret_cast<int *>(in[1]);
-  int n_rhs = *reinterpret_cast<int *>(in[2]);
-  int Anz = *reinterpret_cast<int *>(in[3]);
-  int *Ai = reinterpret_cast<int *>(in[4]);
-  int *Aj = reinterpret_cast<int *>(in[5]);
-  double *Ax = reinterpret_cast<double *>(in[6]);
-  double *b = reinterpret_cast<double *>(in[7]);
+  int n_lhs_b = *reinterpret_cast<int *>(in[2]); // 1 if b is shared
+  int n_rhs = *reinterpret_cast<int *>(in[3]);
+  int Anz = *reinterpret_cast<int *>(in[4]);
+  int *Ai = reinterpret_cast<int *>(in[5]);
+  int *Aj = reinterpret_cast<int *>(in[6]);
+  double *Ax = reinterpret_cast<double *>(in[7]);
+  double *b = reinterpret_cast<double *>(in[8]);
   double *result = reinterpret_cast<double *>(out);
 
   // initialize empty result
@@ -200,21 +420,26 @@ void coo_mul_vec_c128(void *out, void **in) {
   for (int i = 0; i < n_lhs; i++) {
     int m = 2 * i * Anz;
     int n = 2 * i * n_rhs * n_col;
+    int nb = 2 * (i % n_lhs_b) * n_rhs * n_col;
     for (int j = 0; j < n_rhs; j++) {
       for (int k = 0; k < Anz; k++) {
         result[n + 2 * (Ai[k] + j * n_col)] +=               // real part
-            Ax[m + 2 * k] * b[n + 2 * (Aj[k] + j * n_col)] - // real * real
+            Ax[m + 2 * k] * b[nb + 2 * (Aj[k] + j * n_col)] - // real * real
             Ax[m + 2 * k + 1] *
-                b[n + 2 * (Aj[k] + j * n_col) + 1];              // imag * imag
+                b[nb + 2 * (Aj[k] + j * n_col) + 1];              // imag * imag
         result[n + 2 * (Ai[k] + j * n_col) + 1] +=               // imag part
-            Ax[m + 2 * k] * b[n + 2 * (Aj[k] + j * n_col) + 1] + // real * imag
-            Ax[m + 2 * k + 1] * b[n + 2 * (Aj[k] + j * n_col)];  // imag * real
+            Ax[m + 2 * k] * b[nb + 2 * (Aj[k] + j * n_col) + 1] + // real * imag
+            Ax[m + 2 * k + 1] * b[nb + 2 * (Aj[k] + j * n_col)];  // imag * real
       }
     }
   }
 }
 
 PYBIND11_MODULE(klujax_cpp, m) {
+  m.def("clear_symbolic_cache", &clear_symbolic_cache,
+        "clear the cache of KLU symbolic factorizations");
+  m.def("symbolic_cache_size", &symbolic_cache_size,
+        "the number of cached KLU symbolic factorizations");
   m.def(
       "solve_f64",
       []() {
@@ -222,6 +447,13 @@ PYBIND11_MODULE(klujax_cpp, m) {
         return py::capsule((void *)&solve_f64, name);
       },
       "solve a real-valued linear system of equations");
+  m.def(
+      "solve_f64_t",
+      []() {
+        const char *name = "xla._CUSTOM_CALL_TARGET";
+        return py::capsule((void *)&solve_f64_t, name);
+      },
+      "solve a transposed real-valued linear system of equations");
   m.def(
       "solve_c128",
       []() {
@@ -229,6 +461,41 @@ PYBIND11_MODULE(klujax_cpp, m) {
         return py::capsule((void *)&solve_c128, name);
       },
       "solve a complex-valued linear system of equations");
+  m.def(
+      "solve_c128_t",
+      []() {
+        const char *name = "xla._CUSTOM_CALL_TARGET";
+        return py::capsule((void *)&solve_c128_t, name);
+      },
+      "solve a transposed complex-valued linear system of equations");
+  m.def(
+      "solve_csc_f64",
+      []() {
+        const char *name = "xla._CUSTOM_CALL_TARGET";
+        return py::capsule((void *)&solve_csc_f64, name);
+      },
+      "solve a real-valued linear system of equations given in CSC format");
+  m.def(
+      "solve_csc_f64_t",
+      []() {
+        const char *name = "xla._CUSTOM_CALL_TARGET";
+        return py::capsule((void *)&solve_csc_f64_t, name);
+      },
+      "solve a transposed real-valued linear system given in CSC format");
+  m.def(
+      "solve_csc_c128",
+      []() {
+        const char *name = "xla._CUSTOM_CALL_TARGET";
+        return py::capsule((void *)&solve_csc_c128, name);
+      },
+      "solve a complex-valued linear system of equations given in CSC format");
+  m.def(
+      "solve_csc_c128_t",
+      []() {
+        const char *name = "xla._CUSTOM_CALL_TARGET";
+        return py::capsule((void *)&solve_csc_c128_t, name);
+      },
+      "solve a transposed complex-valued linear system given in CSC format");
   m.def(
       "coo_mul_vec_f64",
       []() {
@@ -3,12 +3,23 @@
 __version__ = "0.0.6"
 __author__ = "Floris Laporte"
 
-__all__ = ["solve", "coo_mul_vec"]
+__all__ = [
+    "Pattern",
+    "solve",
+    "solve_batched",
+    "solve_csc",
+    "coo_to_csc",
+    "coo_mul_vec",
+    "clear_symbolic_cache",
+]
 
 ## IMPORTS
 
+import warnings
 from time import time
-from functools import partial
+from dataclasses import dataclass
+from functools import lru_cache, partial
+from math import prod
 
 import jax
 import numpy as np
@@ -25,34 +36,55 @@ import klujax_cpp
 
 ## CONSTANTS
 
-COMPLEX_DTYPES = (
-    np.complex64,
-    np.complex128,
-    np.complex256,
-    jnp.complex64,
-    jnp.complex128,
-)
+_I32_SCALAR_SHAPE = xla_client.Shape.array_shape(np.dtype(np.int32), (), ())
+
+# coo_mul_vec falls back to a dense matmul above these fill ratios (Anz / n_col²)
+# NOTE: Anz counts duplicate COO entries, so a pattern with many duplicates
+# may be routed to the dense matmul while its true fill ratio is lower.
+DENSE_FILL_THRESHOLD_F64 = 0.25
+DENSE_FILL_THRESHOLD_C128 = 0.125
 
 ## PRIMITIVES
 
-solve_f64 = core.Primitive("solve_f64")
-solve_c128 = core.Primitive("solve_c128")
-coo_mul_vec_f64 = core.Primitive("coo_mul_vec_f64")
-coo_mul_vec_c128 = core.Primitive("coo_mul_vec_c128")
+solve_p = core.Primitive("solve")
+solve_csc_p = core.Primitive("solve_csc")
+coo_mul_vec_p = core.Primitive("coo_mul_vec")
+
+## CUSTOM CALL TARGETS
+
+for _name in [
+    "solve_f64",
+    "solve_f64_t",
+    "solve_c128",
+    "solve_c128_t",
+    "solve_csc_f64",
+    "solve_csc_f64_t",
+    "solve_csc_c128",
+    "solve_csc_c128_t",
+    "coo_mul_vec_f64",
+    "coo_mul_vec_c128",
+]:
+    xla_client.register_cpu_custom_call_target(
+        _name.encode(), getattr(klujax_cpp, _name)()
+    )
 
 
 ## EXTRA DECORATORS
 
 
-def xla_register_cpu(primitive, cpp_fun):
-    name = primitive.name.encode()
-
+def xla_register_cpu(primitive):
     def decorator(fun):
-        xla_client.register_cpu_custom_call_target(
-            name,
-            cpp_fun(),
+        xla.backend_specific_translations["cpu"][primitive] = partial(
+            fun, primitive.name
         )
-        xla.backend_specific_translations["cpu"][primitive] = partial(fun, name)
+        return fun
+
+    return decorator
+
+
+def impl_register(primitive):
+    def decorator(fun):
+        primitive.def_impl(partial(fun, primitive))
         return fun
 
     return decorator
@@ -74,9 +106,9 @@ def transpose_register(primitive):
     return decorator
 
 
-def vmap_register(primitive, operation):
+def vmap_register(primitive):
     def decorator(fun):
-        batching.primitive_batchers[primitive] = partial(fun, operation)
+        batching.primitive_batchers[primitive] = partial(fun, primitive)
         return fun
 
     return decorator
@@ -85,79 +117,98 @@ def vmap_register(primitive, operation):
 ## IMPLEMENTATIONS
 
 
-@solve_f64.def_impl
-@solve_c128.def_impl
-@coo_mul_vec_f64.def_impl
-@coo_mul_vec_c128.def_impl
-def coo_vec_operation_impl(Ai, Aj, Ax, b):
-    raise NotImplementedError
+@impl_register(solve_p)
+@impl_register(solve_csc_p)
+@impl_register(coo_mul_vec_p)
+def coo_vec_operation_impl(primitive, Ai, Aj, Ax, b, **params):
+    # eager calls compile (and cache) the primitive on its own; under an
+    # enclosing jit the primitive is lowered as part of the caller's graph.
+    return xla.apply_primitive(primitive, Ai, Aj, Ax, b, **params)
 
 
 ## ABSTRACT EVALUATIONS
 
 
-@solve_f64.def_abstract_eval
-@solve_c128.def_abstract_eval
-@coo_mul_vec_f64.def_abstract_eval
-@coo_mul_vec_c128.def_abstract_eval
-def coo_vec_operation_impl(Ai, Aj, Ax, b):
+@solve_p.def_abstract_eval
+@solve_csc_p.def_abstract_eval
+@coo_mul_vec_p.def_abstract_eval
+def coo_vec_operation_impl(Ai, Aj, Ax, b, *, b_shared=False, transpose=False):
+    if b_shared:  # b is reused for each matrix in the batch of Ax
+        return abstract_arrays.ShapedArray((Ax.shape[0], *b.shape), b.dtype)
     return abstract_arrays.ShapedArray(b.shape, b.dtype)
 
 
 # ENABLE JIT
 
 
-@xla_register_cpu(solve_f64, klujax_cpp.solve_f64)
-@xla_register_cpu(solve_c128, klujax_cpp.solve_c128)
-@xla_register_cpu(coo_mul_vec_f64, klujax_cpp.coo_mul_vec_f64)
-@xla_register_cpu(coo_mul_vec_c128, klujax_cpp.coo_mul_vec_c128)
-def coo_vec_operation_xla(primitive_name, c, Ai, Aj, Ax, b):
+def _with_default_layout(shape):
+    # explicit minor-to-major (0,) layout for the 1D index buffers
+    return xla_client.Shape.array_shape(shape.element_type(), shape.dimensions(), (0,))
+
+
+@xla_register_cpu(solve_p)
+@xla_register_cpu(solve_csc_p)
+@xla_register_cpu(coo_mul_vec_p)
+def coo_vec_operation_xla(
+    primitive_name, c, Ai, Aj, Ax, b, *, b_shared=False, transpose=False
+):
     Ax_shape = c.get_shape(Ax)
-    Ai_shape = c.get_shape(Ai)
-    Aj_shape = c.get_shape(Aj)
+    Ai_shape = _with_default_layout(c.get_shape(Ai))
+    Aj_shape = _with_default_layout(c.get_shape(Aj))
     b_shape = c.get_shape(b)
+    if np.issubdtype(Ax_shape.element_type(), np.complexfloating):
+        target_name = f"{primitive_name}_c128"
+    else:
+        target_name = f"{primitive_name}_f64"
+    if transpose:  # solve Aᵀ x = b with klu_tsolve
+        target_name = f"{target_name}_t"
+    target_name = target_name.encode()
     *_n_lhs_list, _Anz = Ax_shape.dimensions()
     assert len(_n_lhs_list) < 2, "solve alows for maximum one batch dimension."
-    _n_lhs = np.prod(np.array(_n_lhs_list, np.int32))
+    _n_lhs = prod(_n_lhs_list)
     Ax = xla_client.ops.Reshape(Ax, (_n_lhs * _Anz,))
-    Ax_shape = c.get_shape(Ax)
-    if _n_lhs_list:
+    Ax_shape = xla_client.Shape.array_shape(
+        Ax_shape.element_type(), (_n_lhs * _Anz,), (0,)
+    )
+    if _n_lhs_list and not b_shared:
         _n_lhs_b, _n_col, *_n_rhs_list = b_shape.dimensions()
+        assert _n_lhs_b == _n_lhs, "Batch dimension of Ax and b don't match."
     else:
         _n_col, *_n_rhs_list = b_shape.dimensions()
         _n_lhs_b = 1
-    assert _n_lhs_b == _n_lhs, "Batch dimension of Ax and b don't match."
-    _n_rhs = np.prod(np.array(_n_rhs_list, dtype=np.int32))
-    b = xla_client.ops.Reshape(b, (_n_lhs, _n_col, _n_rhs))
-    b = xla_client.ops.Transpose(b, (0, 2, 1))
-    b = xla_client.ops.Reshape(b, (_n_lhs * _n_rhs * _n_col,))
-    b_shape = c.get_shape(b)
+    _n_rhs = prod(_n_rhs_list)
+    b = xla_client.ops.Reshape(b, (_n_lhs_b, _n_col, _n_rhs))
+    # minor-to-major (1, 2, 0): n_col is the fastest varying axis in memory,
+    # which is the (n_lhs, n_rhs, n_col) buffer order KLU expects. Letting XLA
+    # pick this layout avoids explicit transposes around the custom call.
+    b_shape = xla_client.Shape.array_shape(
+        b_shape.element_type(), (_n_lhs_b, _n_col, _n_rhs), (1, 2, 0)
+    )
+    result_shape = xla_client.Shape.array_shape(
+        b_shape.element_type(), (_n_lhs, _n_col, _n_rhs), (1, 2, 0)
+    )
     Anz = xla_client.ops.ConstantLiteral(c, np.int32(_Anz))
     n_col = xla_client.ops.ConstantLiteral(c, np.int32(_n_col))
     n_rhs = xla_client.ops.ConstantLiteral(c, np.int32(_n_rhs))
     n_lhs = xla_client.ops.ConstantLiteral(c, np.int32(_n_lhs))
-    Anz_shape = xla_client.Shape.array_shape(np.dtype(np.int32), (), ())
-    n_col_shape = xla_client.Shape.array_shape(np.dtype(np.int32), (), ())
-    n_lhs_shape = xla_client.Shape.array_shape(np.dtype(np.int32), (), ())
-    n_rhs_shape = xla_client.Shape.array_shape(np.dtype(np.int32), (), ())
+    n_lhs_b = xla_client.ops.ConstantLiteral(c, np.int32(_n_lhs_b))
     result = xla_client.ops.CustomCallWithLayout(
         c,
-        primitive_name,
-        operands=(n_col, n_lhs, n_rhs, Anz, Ai, Aj, Ax, b),
+        target_name,
+        operands=(n_col, n_lhs, n_lhs_b, n_rhs, Anz, Ai, Aj, Ax, b),
         operand_shapes_with_layout=(
-            n_col_shape,
-            n_lhs_shape,
-            n_rhs_shape,
-            Anz_shape,
+            _I32_SCALAR_SHAPE,
+            _I32_SCALAR_SHAPE,
+            _I32_SCALAR_SHAPE,
+            _I32_SCALAR_SHAPE,
+            _I32_SCALAR_SHAPE,
             Ai_shape,
             Aj_shape,
             Ax_shape,
             b_shape,
         ),
-        shape_with_layout=b_shape,
+        shape_with_layout=result_shape,
     )
-    result = xla_client.ops.Reshape(result, (_n_lhs, _n_rhs, _n_col))
-    result = xla_client.ops.Transpose(result, (0, 2, 1))
     if _n_lhs_list:
         result = xla_client.ops.Reshape(result, (_n_lhs, _n_col, *_n_rhs_list))
     else:
@@ -168,117 +219,448 @@ def coo_vec_operation_xla(primitive_name, c, Ai, Aj, Ax, b):
 # ENABLE FORWARD GRAD
 
 
-@ad_register(solve_f64)
-def solve_f64_value_and_jvp(arg_values, arg_tangents):
+@ad_register(solve_p)
+def solve_value_and_jvp(arg_values, arg_tangents, **params):
     # A x - b = 0
     # ∂A x + A ∂x - ∂b = 0
     # ∂x = A^{-1} (∂b - ∂A x)
+    # (or with Aᵀ and ∂Aᵀ in case of a transposed solve)
     Ai, Aj, Ax, b = arg_values
     dAi, dAj, dAx, db = arg_tangents
-    dAx = dAx if not isinstance(dAx, ad.Zero) else lax.zeros_like_array(Ax)
-    dAi = dAi if not isinstance(dAi, ad.Zero) else lax.zeros_like_array(Ai)
-    dAj = dAj if not isinstance(dAj, ad.Zero) else lax.zeros_like_array(Aj)
     db = db if not isinstance(db, ad.Zero) else lax.zeros_like_array(b)
 
-    x = solve(Ai, Aj, Ax, b)
-    dA_x = coo_mul_vec(Ai, Aj, dAx, x)
-    dx = solve(Ai, Aj, Ax, db)  # - dA_x)
+    x = solve_p.bind(Ai, Aj, Ax, b, **params)
+    if isinstance(dAx, ad.Zero):  # don't bind an unused coo_mul_vec
+        dx = solve_p.bind(Ai, Aj, Ax, db, **params)
+    else:
+        # ∂b - ∂A x has the full batch shape of x, even if b is shared.
+        if params.get("transpose", False):
+            dA_x = coo_mul_vec(Aj, Ai, dAx, x)
+        else:
+            dA_x = coo_mul_vec(Ai, Aj, dAx, x)
+        dx = solve_p.bind(Ai, Aj, Ax, db - dA_x, **{**params, "b_shared": False})
 
     return x, dx
 
 
+@ad_register(solve_csc_p)
+def solve_csc_value_and_jvp(arg_values, arg_tangents, **params):
+    Ap, Ai, Ax, b = arg_values
+    dAp, dAi, dAx, db = arg_tangents
+    db = db if not isinstance(db, ad.Zero) else lax.zeros_like_array(b)
+
+    x = solve_csc_p.bind(Ap, Ai, Ax, b, **params)
+    if isinstance(dAx, ad.Zero):  # don't bind an unused coo_mul_vec
+        dx = solve_csc_p.bind(Ap, Ai, Ax, db, **params)
+    else:
+        if params.get("transpose", False):
+            dA_x = coo_mul_vec(_csc_cols(Ap, Ai), Ai, dAx, x)
+        else:
+            dA_x = coo_mul_vec(Ai, _csc_cols(Ap, Ai), dAx, x)
+        dx = solve_csc_p.bind(Ap, Ai, Ax, db - dA_x, **{**params, "b_shared": False})
+
+    return x, dx
+
+
+@ad_register(coo_mul_vec_p)
+def coo_mul_vec_value_and_jvp(arg_values, arg_tangents, **params):
+    # A b is bilinear in (Ax, b): ∂(A b) = ∂A b + A ∂b
+    Ai, Aj, Ax, b = arg_values
+    dAi, dAj, dAx, db = arg_tangents
+
+    y = coo_mul_vec_p.bind(Ai, Aj, Ax, b, **params)
+    if isinstance(db, ad.Zero):  # skip the terms of zero tangents
+        dy = coo_mul_vec_p.bind(Ai, Aj, dAx, b, **params)
+    elif isinstance(dAx, ad.Zero):
+        dy = coo_mul_vec_p.bind(Ai, Aj, Ax, db, **params)
+    else:
+        dy = coo_mul_vec_p.bind(Ai, Aj, dAx, b, **params)
+        dy = dy + coo_mul_vec_p.bind(Ai, Aj, Ax, db, **params)
+
+    return y, dy
+
+
 # ENABLE BACKWARD GRAD
 
 
-@transpose_register(solve_f64)
-def solve_f64_transpose(ct, Ai, Aj, Ax, b):
+@transpose_register(solve_p)
+def solve_transpose(ct, Ai, Aj, Ax, b, *, b_shared=False, transpose=False):
+    # the linear transpose (not the adjoint) is needed, also for complex A.
+    # klu_tsolve solves with Aᵀ while factorizing the same A as the forward
+    # pass, such that both share the same sparsity pattern.
+    assert ad.is_undefined_primal(b)
+    ct_b = solve_p.bind(Ai, Aj, Ax, ct, b_shared=False, transpose=not transpose)
+    if b_shared:
+        ct_b = ct_b.sum(0)
+    return None, None, None, ct_b
+
+
+@transpose_register(solve_csc_p)
+def solve_csc_transpose(ct, Ap, Ai, Ax, b, *, b_shared=False, transpose=False):
     assert ad.is_undefined_primal(b)
-    ct_b = solve(Ai, Aj, Ax, ct)  # probably not correct...
+    ct_b = solve_csc_p.bind(Ap, Ai, Ax, ct, b_shared=False, transpose=not transpose)
+    if b_shared:
+        ct_b = ct_b.sum(0)
     return None, None, None, ct_b
 
 
+@transpose_register(coo_mul_vec_p)
+def coo_mul_vec_transpose(ct, Ai, Aj, Ax, b, *, b_shared=False):
+    # coo_mul_vec is linear in Ax and in b separately (needed for the solve jvp)
+    if ad.is_undefined_primal(b):
+        ct_b = coo_mul_vec(Aj, Ai, Ax, ct)  # Aᵀ ct
+        if b_shared:
+            ct_b = ct_b.sum(0)
+        return None, None, None, ct_b
+
+    assert ad.is_undefined_primal(Ax)
+    batched = Ax.aval.ndim == 2
+    if not batched:
+        ct, b = ct[None], b[None]
+    elif b_shared:
+        b = b[None]
+    n_lhs = ct.shape[0]
+    ct_Ax = (ct[:, Ai] * b[:, Aj]).reshape(n_lhs, Ai.shape[0], -1).sum(-1)
+    if not batched:
+        ct_Ax = ct_Ax[0]
+    return None, None, ct_Ax, None
+
+
+## SPARSITY PATTERN
+
+
+@dataclass(eq=False)  # no elementwise __eq__ on the index arrays
+class Pattern:
+    """the COO sparsity pattern (Ai, Aj) of a matrix, cast to int32 once.
+
+    Pass a pattern instead of (Ai, Aj) when the same sparsity pattern is
+    reused for many solves, e.g. `solve(pattern, Ax, b)`.
+    """
+
+    Ai: jnp.ndarray
+    Aj: jnp.ndarray
+
+    def __post_init__(self):
+        self.Ai = _astype(jnp.asarray(self.Ai), jnp.int32)
+        self.Aj = _astype(jnp.asarray(self.Aj), jnp.int32)
+        assert self.Ai.shape == self.Aj.shape, "Ai and Aj should have equal shape."
+
+
+def _pattern_flatten(pattern):
+    return (pattern.Ai, pattern.Aj), None
+
+
+def _pattern_unflatten(_, children):
+    pattern = object.__new__(Pattern)  # skip validation of (traced) children
+    pattern.Ai, pattern.Aj = children
+    return pattern
+
+
+jax.tree_util.register_pytree_node(Pattern, _pattern_flatten, _pattern_unflatten)
+
+
 ## THE FUNCTIONS
 
 
-@jax.jit  # jitting by default allows for empty implementation definitions
-def solve(Ai, Aj, Ax, b):
-    if any(x.dtype in COMPLEX_DTYPES for x in (Ax, b)):
-        result = solve_c128.bind(
-            Ai.astype(jnp.int32),
-            Aj.astype(jnp.int32),
-            Ax.astype(jnp.complex128),
-            b.astype(jnp.complex128),
+def solve(Ai, Aj=None, Ax=None, b=None):
+    """solve A x = b for a sparse COO matrix A = (Ai, Aj, Ax).
+
+    usage: `solve(Ai, Aj, Ax, b)` or `solve(pattern, Ax, b)`.
+
+    Ax may carry one leading batch dimension. All matrices in such a batch
+    share the sparsity pattern (Ai, Aj), hence the KLU symbolic analysis is
+    performed only once per call and reused for every numeric factorization.
+
+    Moreover, the symbolic analysis of the most recently used sparsity
+    patterns is cached between calls (see `clear_symbolic_cache`).
+
+    The KLU kernel runs without holding the GIL and, apart from the (locked)
+    symbolic cache, keeps all of its state local to the call, so independent
+    systems can be solved concurrently from multiple Python threads.
+    """
+    Ai, Aj, Ax, b = _coo_args(Ai, Aj, Ax, b)
+    if _is_complex(Ax, b):
+        return _solve_c128(Ai, Aj, Ax, b)
+    return _solve_f64(Ai, Aj, Ax, b)
+
+
+def solve_batched(Ai, Aj=None, Ax=None, B=None):
+    """solve A X = B for a single sparse A and a dense B of shape (n_col, n_rhs).
+
+    usage: `solve_batched(Ai, Aj, Ax, B)` or `solve_batched(pattern, Ax, B)`.
+
+    A is factorized exactly once; all n_rhs columns of B are then solved
+    against that same numeric factorization.
+    """
+    Ai, Aj, Ax, B = _coo_args(Ai, Aj, Ax, B)
+    assert Ax.ndim == 1, "solve_batched expects a single (unbatched) matrix A."
+    assert B.ndim == 2, "solve_batched expects B of shape (n_col, n_rhs)."
+    return solve(Pattern(Ai, Aj), Ax, B)
+
+
+def solve_csc(Ap, Ai, Ax, b):
+    """solve A x = b for a sparse CSC matrix A = (Ap, Ai, Ax).
+
+    Ap are the column pointers with shape (n_col + 1,) and Ai the row indices
+    with shape (Anz,). The CSC arrays are handed to KLU as-is, which skips the
+    COO -> CSC conversion done by `solve`. Use `coo_to_csc` to convert a COO
+    sparsity pattern once.
+    """
+    Ap, Ai = _astype(Ap, jnp.int32), _astype(Ai, jnp.int32)
+    # KLU reads Ap[0..n_col] and Ai[0..Anz) unchecked: validate the shapes here.
+    n_col = b.shape[Ax.ndim - 1]
+    assert Ap.shape == (n_col + 1,), "Ap should have shape (n_col + 1,)."
+    assert Ai.shape == Ax.shape[-1:], "Ai and the last axis of Ax should match."
+    if _is_complex(Ax, b):
+        return _solve_csc_c128(Ap, Ai, Ax, b)
+    return _solve_csc_f64(Ap, Ai, Ax, b)
+
+
+def coo_to_csc(Ai, Aj, Ax, n_col):
+    """convert a COO matrix (Ai, Aj, Ax) to a CSC matrix (Ap, Bi, Bx).
+
+    The index arrays Ai and Aj should be concrete (i.e. not traced), while Ax
+    can be traced and may carry a leading batch dimension.
+    """
+    Ai = np.asarray(Ai, dtype=np.int32)
+    Aj = np.asarray(Aj, dtype=np.int32)
+    # the (jitted) counting sort does not check bounds: validate the indices here.
+    if Ai.ndim != 1 or Ai.shape != Aj.shape:
+        raise ValueError("Ai and Aj should be 1D arrays of equal shape.")
+    if Ai.shape[0] != jnp.shape(Ax)[-1]:
+        raise ValueError("Ai and the last axis of Ax should match.")
+    if Ai.size and not (0 <= Ai.min() and Ai.max() < n_col):
+        raise ValueError(f"Ai should be in the range [0, {n_col}).")
+    if Aj.size and not (0 <= Aj.min() and Aj.max() < n_col):
+        raise ValueError(f"Aj should be in the range [0, {n_col}).")
+    Ap, Bi, Bk = _coo_to_csc_i32(Ai, Aj, n_col)
+    Bx = jnp.asarray(Ax)[..., Bk]
+    return jnp.asarray(Ap), jnp.asarray(Bi), Bx
+
+
+def _coo_to_csc_i32_loop(Ai, Aj, n_col):
+    # two-pass counting sort of the COO entries by column: O(Anz + n_col)
+    Anz = Ai.shape[0]
+    Ap = np.zeros(n_col + 1, dtype=np.int32)
+    for k in range(Anz):
+        Ap[Aj[k] + 1] += 1
+    for j in range(n_col):
+        Ap[j + 1] += Ap[j]
+    Bi = np.empty(Anz, dtype=np.int32)
+    Bk = np.empty(Anz, dtype=np.int32)  # Ax -> Bx transformation indices
+    dest = Ap[:-1].copy()
+    for k in range(Anz):
+        col = Aj[k]
+        Bi[dest[col]] = Ai[k]
+        Bk[dest[col]] = k
+        dest[col] += 1
+    return Ap, Bi, Bk
+
+
+def _coo_to_csc_i32_numpy(Ai, Aj, n_col):
+    # vectorized equivalent of _coo_to_csc_i32_loop if numba is not available
+    Bk = np.argsort(Aj, kind="stable").astype(np.int32)
+    Ap = np.zeros(n_col + 1, dtype=np.int32)
+    np.cumsum(np.bincount(Aj, minlength=n_col), out=Ap[1:])
+    return Ap, Ai[Bk], Bk
+
+
+@lru_cache(maxsize=None)
+def _coo_to_csc_i32_kernel():
+    # numba is only imported (and the loop jitted) on the first coo_to_csc call
+    try:
+        import numba
+    except ImportError:  # numba is an optional dependency
+        return _coo_to_csc_i32_numpy
+    return numba.njit(cache=True)(_coo_to_csc_i32_loop)
+
+
+def _coo_to_csc_i32(Ai, Aj, n_col):
+    return _coo_to_csc_i32_kernel()(Ai, Aj, n_col)
+
+
+def coo_mul_vec(Ai, Aj=None, Ax=None, b=None):
+    Ai, Aj, Ax, b = _coo_args(Ai, Aj, Ax, b)
+    n_col = b.shape[Ax.ndim - 1]
+    if _is_complex(Ax, b):
+        if Ai.shape[0] > DENSE_FILL_THRESHOLD_C128 * n_col * n_col:
+            return _coo_mul_vec_dense(Ai, Aj, Ax, b, jnp.complex128)
+        return _coo_mul_vec_c128(Ai, Aj, Ax, b)
+    if Ai.shape[0] > DENSE_FILL_THRESHOLD_F64 * n_col * n_col:
+        return _coo_mul_vec_dense(Ai, Aj, Ax, b, jnp.float64)
+    return _coo_mul_vec_f64(Ai, Aj, Ax, b)
+
+
+def clear_symbolic_cache():
+    """clear the cache of KLU symbolic factorizations kept between solves."""
+    klujax_cpp.clear_symbolic_cache()
+
+
+def _coo_args(Ai, Aj, Ax, b):
+    # accepts both (Ai, Aj, Ax, b) and (pattern, Ax, b)
+    if isinstance(Ai, Pattern):
+        if Aj is not None:  # positional call: Aj holds Ax (and Ax holds b)
+            if Ax is not None and b is not None:
+                raise TypeError("expected arguments (pattern, Ax, b), got 4.")
+            Ax, b = Aj, (Ax if b is None else b)
+        if Ax is None or b is None:
+            raise TypeError("expected arguments (pattern, Ax, b).")
+        return Ai.Ai, Ai.Aj, Ax, b
+    if Aj is None or Ax is None or b is None:
+        raise TypeError("expected arguments (Ai, Aj, Ax, b) or (pattern, Ax, b).")
+    if Ai.dtype != jnp.int32 or Aj.dtype != jnp.int32:
+        warnings.warn(
+            "Passing non-int32 index arrays Ai and Aj is deprecated, as they "
+            "need to be cast on every call. Cast them once beforehand or use "
+            "a klujax.Pattern instead.",
+            DeprecationWarning,
+            stacklevel=3,
         )
-    else:
-        result = solve_f64.bind(
-            Ai.astype(jnp.int32),
-            Aj.astype(jnp.int32),
-            Ax.astype(jnp.float64),
-            b.astype(jnp.float64),
-        )
-    return result
+    return Ai, Aj, Ax, b
 
 
-@jax.jit  # jitting by default allows for empty implementation definitions
-def coo_mul_vec(Ai, Aj, Ax, b):
-    if any(x.dtype in COMPLEX_DTYPES for x in (Ax, b)):
-        result = coo_mul_vec_c128.bind(
-            Ai.astype(jnp.int32),
-            Aj.astype(jnp.int32),
-            Ax.astype(jnp.complex128),
-            b.astype(jnp.complex128),
-        )
-    else:
-        result = coo_mul_vec_f64.bind(
-            Ai.astype(jnp.int32),
-            Aj.astype(jnp.int32),
-            Ax.astype(jnp.float64),
-            b.astype(jnp.float64),
-        )
-    return result
+def _is_complex(Ax, b):
+    # a single dtype promotion; also catches e.g. (complex64, float64) inputs
+    return jnp.issubdtype(jnp.result_type(Ax.dtype, b.dtype), jnp.complexfloating)
+
+
+def _astype(x, dtype):
+    # avoid inserting no-op convert_element_type ops into the graph
+    return x if x.dtype == dtype else x.astype(dtype)
+
+
+def _solve_f64(Ai, Aj, Ax, b):
+    return solve_p.bind(
+        _astype(Ai, jnp.int32),
+        _astype(Aj, jnp.int32),
+        _astype(Ax, jnp.float64),
+        _astype(b, jnp.float64),
+        b_shared=False,
+        transpose=False,
+    )
+
+
+def _solve_c128(Ai, Aj, Ax, b):
+    return solve_p.bind(
+        _astype(Ai, jnp.int32),
+        _astype(Aj, jnp.int32),
+        _astype(Ax, jnp.complex128),
+        _astype(b, jnp.complex128),
+        b_shared=False,
+        transpose=False,
+    )
+
+
+def _solve_csc_f64(Ap, Ai, Ax, b):
+    return solve_csc_p.bind(
+        Ap,
+        Ai,
+        _astype(Ax, jnp.float64),
+        _astype(b, jnp.float64),
+        b_shared=False,
+        transpose=False,
+    )
+
+
+def _solve_csc_c128(Ap, Ai, Ax, b):
+    return solve_csc_p.bind(
+        Ap,
+        Ai,
+        _astype(Ax, jnp.complex128),
+        _astype(b, jnp.complex128),
+        b_shared=False,
+        transpose=False,
+    )
+
+
+def _csc_cols(Ap, Ai):
+    # the COO column index of each CSC entry
+    n_col = Ap.shape[0] - 1
+    Aj = jnp.arange(n_col, dtype=jnp.int32)
+    return jnp.repeat(Aj, jnp.diff(Ap), total_repeat_length=Ai.shape[0])
+
+
+def _coo_mul_vec_dense(Ai, Aj, Ax, b, dtype):
+    # for (nearly) dense matrices a dense matmul beats the sparse kernel
+    *n_lhs_list, n_col = b.shape[: Ax.ndim]
+    Ax, b = _astype(Ax, dtype), _astype(b, dtype)
+    A = jnp.zeros((*n_lhs_list, n_col, n_col), dtype=dtype)
+    A = A.at[..., Ai, Aj].add(Ax)
+    result = A @ b.reshape(*n_lhs_list, n_col, -1)
+    return result.reshape(b.shape)
+
+
+def _coo_mul_vec_f64(Ai, Aj, Ax, b):
+    return coo_mul_vec_p.bind(
+        _astype(Ai, jnp.int32),
+        _astype(Aj, jnp.int32),
+        _astype(Ax, jnp.float64),
+        _astype(b, jnp.float64),
+        b_shared=False,
+    )
+
+
+def _coo_mul_vec_c128(Ai, Aj, Ax, b):
+    return coo_mul_vec_p.bind(
+        _astype(Ai, jnp.int32),
+        _astype(Aj, jnp.int32),
+        _astype(Ax, jnp.complex128),
+        _astype(b, jnp.complex128),
+        b_shared=False,
+    )
 
 
 # ENABLE VMAP
 
 
-@vmap_register(solve_f64, solve)
-@vmap_register(solve_c128, solve)
-@vmap_register(coo_mul_vec_f64, coo_mul_vec)
-@vmap_register(coo_mul_vec_c128, coo_mul_vec)
-def coo_vec_operation_vmap(operation, vector_arg_values, batch_axes):
+def _move_axis(x, source, destination):
+    # a single explicit transpose which XLA can fuse with a following reshape
+    perm = [i for i in range(x.ndim) if i != source]
+    perm.insert(destination, source)
+    return jnp.transpose(x, perm)
+
+
+@vmap_register(solve_p)
+@vmap_register(solve_csc_p)
+@vmap_register(coo_mul_vec_p)
+def coo_vec_operation_vmap(
+    primitive, vector_arg_values, batch_axes, *, b_shared=False, **params
+):
     aAi, aAj, aAx, ab = batch_axes
     Ai, Aj, Ax, b = vector_arg_values
 
     assert aAi is None, "Ai cannot be vectorized."
     assert aAj is None, "Aj cannot be vectorized."
+    assert not b_shared, "nested vmap over a shared b is not supported."
 
     if aAx is not None and ab is not None:
         assert isinstance(aAx, int) and isinstance(ab, int)
         n_lhs = Ax.shape[aAx]
+        if aAx != 0:
+            Ax = _move_axis(Ax, aAx, 0)
         if ab != 0:
-            Ax = jnp.moveaxis(Ax, aAx, 0)
-        if ab != 0:
-            b = jnp.moveaxis(b, ab, 0)
-        result = operation(Ai, Aj, Ax, b)
+            b = _move_axis(b, ab, 0)
+        result = primitive.bind(Ai, Aj, Ax, b, b_shared=False, **params)
         return result, 0
 
     if ab is None:
         assert isinstance(aAx, int)
         n_lhs = Ax.shape[aAx]
         if aAx != 0:
-            Ax = jnp.moveaxis(Ax, aAx, 0)
-        b = jnp.broadcast_to(b[None], (Ax.shape[0], *b.shape))
-        result = operation(Ai, Aj, Ax, b)
+            Ax = _move_axis(Ax, aAx, 0)
+        # b is not broadcasted: the kernel reuses it for each matrix in Ax.
+        result = primitive.bind(Ai, Aj, Ax, b, b_shared=True, **params)
         return result, 0
 
     if aAx is None:
         assert isinstance(ab, int)
-        if ab != 0:
-            b = jnp.moveaxis(b, ab, 0)
-        n_lhs, n_col, *n_rhs_list = b.shape
-        n_rhs = np.prod(np.array(n_rhs_list, dtype=np.int32))
-        b = b.reshape(n_lhs, n_col, n_rhs).transpose((1, 0, 2)).reshape(n_col, -1)
-        result = operation(Ai, Aj, Ax, b)
+        # the batch axis of b becomes an extra rhs axis right after n_col, such
+        # that b keeps KLU's column-major rhs layout without a transpose.
+        if ab != 1:
+            b = _move_axis(b, ab, 1)
+        n_col, n_lhs, *n_rhs_list = b.shape
+        b = b.reshape(n_col, -1)
+        result = primitive.bind(Ai, Aj, Ax, b, b_shared=False, **params)
         result = result.reshape(n_col, n_lhs, *n_rhs_list)
         return result, 1
 
@@ -314,6 +696,7 @@ if __name__ == "__main__":
     b = jnp.array([8, 45, -3, 3, 19], dtype=jnp.float64)
     Ai, Aj = jnp.where(abs(A) > 0)
     Ax = A[Ai, Aj]
+    Ai, Aj = Ai.astype(jnp.int32), Aj.astype(jnp.int32)
 
     t = time()
     result = solve(Ai, Aj, Ax, b)
@@ -53,6 +53,7 @@ setup(
     ext_modules=[klujax_cpp],
     cmdclass={"build_ext": build_ext},  # type: ignore
     install_requires=["jax", "jaxlib"],
+    extras_require={"numba": ["numba"]},
     classifiers=[
         "Development Status :: 3 - Alpha",
         "Programming Language :: Python :: 3",
@@ -30,6 +30,363 @@ def test_solve_f64():
     np.testing.assert_array_almost_equal(x_sp, x)
 
 
+def test_solve_batched_f64():
+    print("\ntest_solve_batched_f64")
+    n_nz = 8
+    n_col = 5
+    n_rhs = 3
+    Axkey, Aikey, Ajkey, bkey = jax.random.split(jax.random.PRNGKey(33), 4)
+    Ax = jax.random.normal(Axkey, (n_nz,))
+    Ai = jax.random.randint(Aikey, (n_nz,), 0, n_col, jnp.int32)
+    Aj = jax.random.randint(Ajkey, (n_nz,), 0, n_col, jnp.int32)
+    B = jax.random.normal(bkey, (n_col, n_rhs))
+    x_sp = klujax.solve_batched(Ai, Aj, Ax, B)
+
+    A = jnp.zeros((n_col, n_col), dtype=jnp.float64).at[Ai, Aj].add(Ax)
+    x = jsp.linalg.solve(A, B)
+
+    print(x)
+    print(x_sp)
+    np.testing.assert_array_almost_equal(x_sp, x)
+
+
+def test_solve_f64_pattern():
+    print("\ntest_solve_f64_pattern")
+    n_nz = 8
+    n_col = 5
+    n_rhs = 1
+    Axkey, Aikey, Ajkey, bkey = jax.random.split(jax.random.PRNGKey(33), 4)
+    Ax = jax.random.normal(Axkey, (n_nz,))
+    Ai = jax.random.randint(Aikey, (n_nz,), 0, n_col, jnp.int64)
+    Aj = jax.random.randint(Ajkey, (n_nz,), 0, n_col, jnp.int64)
+    b = jax.random.normal(bkey, (n_col, n_rhs))
+    pattern = klujax.Pattern(Ai, Aj)
+    assert pattern.Ai.dtype == jnp.int32
+    assert pattern.Aj.dtype == jnp.int32
+    x_sp = jax.jit(klujax.solve)(pattern, Ax, b)
+
+    A = jnp.zeros((n_col, n_col), dtype=jnp.float64).at[Ai, Aj].add(Ax)
+    x = jsp.linalg.solve(A, b)
+
+    print(x)
+    print(x_sp)
+    np.testing.assert_array_almost_equal(x_sp, x)
+
+    # keyword arguments keep working next to the pattern form
+    x_sp = klujax.solve(pattern.Ai, pattern.Aj, Ax, b=b)
+    np.testing.assert_array_almost_equal(x_sp, x)
+    x_sp = klujax.solve(pattern, Ax, b=b)
+    np.testing.assert_array_almost_equal(x_sp, x)
+    x_sp = klujax.solve(pattern, Ax=Ax, b=b)
+    np.testing.assert_array_almost_equal(x_sp, x)
+    x_sp = klujax.solve_batched(pattern, Ax=Ax, B=b)
+    np.testing.assert_array_almost_equal(x_sp, x)
+
+    try:
+        klujax.solve(pattern, Ax)
+    except TypeError:
+        pass
+    else:
+        raise AssertionError("solve(pattern, Ax) should raise a TypeError.")
+
+
+def test_solve_f64_symbolic_cache():
+    print("\ntest_solve_f64_symbolic_cache")
+    n_nz = 8
+    n_col = 5
+    n_rhs = 1
+    Axkey, Aikey, Ajkey, bkey = jax.random.split(jax.random.PRNGKey(33), 4)
+    Ax = jax.random.normal(Axkey, (2, n_nz))
+    Ai = jax.random.randint(Aikey, (n_nz,), 0, n_col, jnp.int32)
+    Aj = jax.random.randint(Ajkey, (n_nz,), 0, n_col, jnp.int32)
+    b = jax.random.normal(bkey, (n_col, n_rhs))
+
+    klujax.clear_symbolic_cache()
+    assert klujax.klujax_cpp.symbolic_cache_size() == 0
+    for i in range(2):  # the second solve reuses the cached symbolic analysis
+        x_sp = klujax.solve(Ai, Aj, Ax[i], b)
+        A = jnp.zeros((n_col, n_col), dtype=jnp.float64).at[Ai, Aj].add(Ax[i])
+        x = jsp.linalg.solve(A, b)
+        np.testing.assert_array_almost_equal(x_sp, x)
+        assert klujax.klujax_cpp.symbolic_cache_size() == 1
+
+    # alternating patterns with the same n_col never reuse a stale analysis
+    for i in range(4):
+        Bi, Bj = (Ai, Aj) if i % 2 == 0 else (Aj, Ai)
+        x_sp = klujax.solve(Bi, Bj, Ax[i % 2], b)
+        A = jnp.zeros((n_col, n_col), dtype=jnp.float64).at[Bi, Bj].add(Ax[i % 2])
+        x = jsp.linalg.solve(A, b)
+        np.testing.assert_array_almost_equal(x_sp, x)
+    assert klujax.klujax_cpp.symbolic_cache_size() == 2
+
+    klujax.clear_symbolic_cache()
+    assert klujax.klujax_cpp.symbolic_cache_size() == 0
+
+
+def test_solve_csc_f64():
+    print("\ntest_solve_csc_f64")
+    n_nz = 8
+    n_col = 5
+    n_rhs = 1
+    Axkey, Aikey, Ajkey, bkey = jax.random.split(jax.random.PRNGKey(33), 4)
+    Ax = jax.random.normal(Axkey, (n_nz,))
+    Ai = jax.random.randint(Aikey, (n_nz,), 0, n_col, jnp.int32)
+    Aj = jax.random.randint(Ajkey, (n_nz,), 0, n_col, jnp.int32)
+    b = jax.random.normal(bkey, (n_col, n_rhs))
+    Bp, Bi, Bx = klujax.coo_to_csc(Ai, Aj, Ax, n_col)
+    x_sp = klujax.solve_csc(Bp, Bi, Bx, b)
+
+    A = jnp.zeros((n_col, n_col), dtype=jnp.float64).at[Ai, Aj].add(Ax)
+    x = jsp.linalg.solve(A, b)
+
+    print(x)
+    print(x_sp)
+    np.testing.assert_array_almost_equal(x_sp, x)
+
+
+def test_solve_csc_f64_grad():
+    print("\ntest_solve_csc_f64_grad")
+    n_nz = 8
+    n_col = 5
+    n_rhs = 1
+    Axkey, Aikey, Ajkey, bkey, dAxkey, dbkey = jax.random.split(
+        jax.random.PRNGKey(33), 6
+    )
+    Ax = jax.random.normal(Axkey, (n_nz,))
+    Ai = jax.random.randint(Aikey, (n_nz,), 0, n_col, jnp.int32)
+    Aj = jax.random.randint(Ajkey, (n_nz,), 0, n_col, jnp.int32)
+    b = jax.random.normal(bkey, (n_col, n_rhs))
+    db = jax.random.normal(dbkey, (n_col, n_rhs))
+    Bp, Bi, Bx = klujax.coo_to_csc(Ai, Aj, Ax, n_col)
+    Bj = np.repeat(np.arange(n_col), np.diff(Bp))
+    dBx = jax.random.normal(dAxkey, (n_nz,))
+
+    def solve_sp(Bx, b):
+        return klujax.solve_csc(Bp, Bi, Bx, b)
+
+    def solve_dense(Bx, b):
+        A = jnp.zeros((n_col, n_col), dtype=jnp.float64).at[Bi, Bj].add(Bx)
+        return jsp.linalg.solve(A, b)
+
+    _, dx_sp = jax.jvp(solve_sp, (Bx, b), (dBx, db))
+    _, dx = jax.jvp(solve_dense, (Bx, b), (dBx, db))
+
+    print(dx)
+    print(dx_sp)
+    np.testing.assert_array_almost_equal(dx_sp, dx)
+
+    def loss_sp(Bx, b):
+        return (solve_sp(Bx, b) ** 2).sum()
+
+    def loss_dense(Bx, b):
+        return (solve_dense(Bx, b) ** 2).sum()
+
+    dBx_sp, db_sp = jax.grad(loss_sp, (0, 1))(Bx, b)
+    dBx, db = jax.grad(loss_dense, (0, 1))(Bx, b)
+
+    print(dBx)
+    print(dBx_sp)
+    np.testing.assert_array_almost_equal(dBx_sp, dBx)
+    np.testing.assert_array_almost_equal(db_sp, db)
+
+    try:  # a column pointer array of the wrong length is rejected
+        klujax.solve_csc(Bp[:-1], Bi, Bx, b)
+    except AssertionError:
+        pass
+    else:
+        raise AssertionError("solve_csc should reject Ap of the wrong shape.")
+
+
+def test_solve_csc_c128_vmap():
+    print("\ntest_solve_csc_c128_vmap")
+    n_lhs = 23
+    n_nz = 8
+    n_col = 5
+    n_rhs = 1
+    Axkey, Aikey, Ajkey, bkey = jax.random.split(jax.random.PRNGKey(33), 4)
+    Ax = jax.random.normal(Axkey, (2, n_lhs, n_nz))
+    Ax = Ax[0] + 1j * Ax[1]
+    Ai = jax.random.randint(Aikey, (n_nz,), 0, n_col, jnp.int32)
+    Aj = jax.random.randint(Ajkey, (n_nz,), 0, n_col, jnp.int32)
+    b = jax.random.normal(bkey, (2, n_lhs, n_col, n_rhs))
+    b = b[0] + 1j * b[1]
+    Bp, Bi, Bx = klujax.coo_to_csc(Ai, Aj, Ax, n_col)
+    Bj = np.repeat(np.arange(n_col), np.diff(Bp))
+
+    vsolve = jax.vmap(klujax.solve_csc, in_axes=(None, None, 0, 0), out_axes=0)
+    x_sp = vsolve(Bp, Bi, Bx, b)
+
+    A = jnp.zeros((n_lhs, n_col, n_col), dtype=jnp.complex128).at[:, Bi, Bj].add(Bx)
+    x = jsp.linalg.solve(A, b)
+
+    print(x[:2])
+    print(x_sp[:2])
+    np.testing.assert_array_almost_equal(x_sp, x)
+
+    def loss_sp(Bx, b):
+        return (jnp.abs(vsolve(Bp, Bi, Bx, b)) ** 2).sum()
+
+    def loss_dense(Bx, b):
+        A = jnp.zeros((n_lhs, n_col, n_col), dtype=jnp.complex128)
+        A = A.at[:, Bi, Bj].add(Bx)
+        return (jnp.abs(jsp.linalg.solve(A, b)) ** 2).sum()
+
+    dBx_sp, db_sp = jax.grad(loss_sp, (0, 1))(Bx, b)
+    dBx, db = jax.grad(loss_dense, (0, 1))(Bx, b)
+
+    print(dBx[:2])
+    print(dBx_sp[:2])
+    np.testing.assert_array_almost_equal(dBx_sp, dBx)
+    np.testing.assert_array_almost_equal(db_sp, db)
+
+
+def test_coo_to_csc_i32():
+    print("\ntest_coo_to_csc_i32")
+    n_col = 6
+    # duplicate entries at (1, 2) and (4, 0); columns 3 and 5 are empty
+    Ai = np.array([1, 4, 0, 1, 4, 2, 1, 4], dtype=np.int32)
+    Aj = np.array([2, 0, 4, 2, 0, 1, 2, 4], dtype=np.int32)
+
+    Ap, Bi, Bk = klujax._coo_to_csc_i32_numpy(Ai, Aj, n_col)
+    np.testing.assert_array_equal(Ap, [0, 2, 3, 6, 6, 8, 8])
+    np.testing.assert_array_equal(Bi, Ai[Bk])
+    np.testing.assert_array_equal(Aj[Bk], np.sort(Aj))
+
+    for coo_to_csc_i32 in [klujax._coo_to_csc_i32_loop, klujax._coo_to_csc_i32]:
+        for result, expected in zip(coo_to_csc_i32(Ai, Aj, n_col), (Ap, Bi, Bk)):
+            np.testing.assert_array_equal(result, expected)
+
+    # out of bounds indices are rejected before reaching the counting sort
+    Ax = np.ones(Ai.shape[0])
+    for Ai_, Aj_ in [(Ai, Aj + 2), (Ai, Aj - 1), (Ai - 2, Aj), (Ai, Aj[:-1])]:
+        try:
+            klujax.coo_to_csc(Ai_, Aj_, Ax, n_col)
+        except ValueError:
+            pass
+        else:
+            raise AssertionError("coo_to_csc should reject invalid indices.")
+
+
+def test_solve_f64_jvp():
+    print("\ntest_solve_f64_jvp")
+    n_nz = 8
+    n_col = 5
+    n_rhs = 1
+    Axkey, Aikey, Ajkey, bkey, dAxkey, dbkey = jax.random.split(
+        jax.random.PRNGKey(33), 6
+    )
+    Ax = jax.random.normal(Axkey, (n_nz,))
+    Ai = jax.random.randint(Aikey, (n_nz,), 0, n_col, jnp.int32)
+    Aj = jax.random.randint(Ajkey, (n_nz,), 0, n_col, jnp.int32)
+    b = jax.random.normal(bkey, (n_col, n_rhs))
+    dAx = jax.random.normal(dAxkey, (n_nz,))
+    db = jax.random.normal(dbkey, (n_col, n_rhs))
+
+    def solve_sp(Ax, b):
+        return klujax.solve(Ai, Aj, Ax, b)
+
+    def solve_dense(Ax, b):
+        A = jnp.zeros((n_col, n_col), dtype=jnp.float64).at[Ai, Aj].add(Ax)
+        return jsp.linalg.solve(A, b)
+
+    _, dx_sp = jax.jvp(solve_sp, (Ax, b), (dAx, db))
+    _, dx = jax.jvp(solve_dense, (Ax, b), (dAx, db))
+
+    print(dx)
+    print(dx_sp)
+    np.testing.assert_array_almost_equal(dx_sp, dx)
+
+
+def test_solve_f64_grad():
+    print("\ntest_solve_f64_grad")
+    n_nz = 8
+    n_col = 5
+    n_rhs = 1
+    Axkey, Aikey, Ajkey, bkey = jax.random.split(jax.random.PRNGKey(33), 4)
+    Ax = jax.random.normal(Axkey, (n_nz,))
+    Ai = jax.random.randint(Aikey, (n_nz,), 0, n_col, jnp.int32)
+    Aj = jax.random.randint(Ajkey, (n_nz,), 0, n_col, jnp.int32)
+    b = jax.random.normal(bkey, (n_col, n_rhs))
+
+    def loss_sp(Ax, b):
+        return (klujax.solve(Ai, Aj, Ax, b) ** 2).sum()
+
+    def loss_dense(Ax, b):
+        A = jnp.zeros((n_col, n_col), dtype=jnp.float64).at[Ai, Aj].add(Ax)
+        return (jsp.linalg.solve(A, b) ** 2).sum()
+
+    dAx_sp, db_sp = jax.grad(loss_sp, (0, 1))(Ax, b)
+    dAx, db = jax.grad(loss_dense, (0, 1))(Ax, b)
+
+    print(dAx)
+    print(dAx_sp)
+    np.testing.assert_array_almost_equal(dAx_sp, dAx)
+    np.testing.assert_array_almost_equal(db_sp, db)
+
+
+def test_solve_f64_grad_low_fill():
+    print("\ntest_solve_f64_grad_low_fill")
+    n_lhs = 23
+    n_col = 20  # low fill ratio: the jvp uses the sparse coo_mul_vec kernel
+    n_rhs = 1
+    # a diagonally dominant pattern without duplicate entries
+    Ai = jnp.concatenate([jnp.arange(n_col), jnp.arange(8)]).astype(jnp.int32)
+    Aj = jnp.concatenate([jnp.arange(n_col), (jnp.arange(8) + 3) % n_col])
+    Aj = Aj.astype(jnp.int32)
+    n_nz = Ai.shape[0]
+    Axkey, bkey = jax.random.split(jax.random.PRNGKey(33), 2)
+    Ax = jax.random.normal(Axkey, (n_lhs, n_nz)) + 4.0 * (Ai == Aj)
+    b = jax.random.normal(bkey, (n_lhs, n_col, n_rhs))
+    assert n_nz < klujax.DENSE_FILL_THRESHOLD_F64 * n_col * n_col
+
+    def loss_sp(Ax, b):
+        return (klujax.solve(Ai, Aj, Ax, b) ** 2).sum()
+
+    def loss_dense(Ax, b):
+        A = jnp.zeros((n_col, n_col), dtype=jnp.float64).at[Ai, Aj].add(Ax)
+        return (jsp.linalg.solve(A, b) ** 2).sum()
+
+    dAx_sp, db_sp = jax.grad(loss_sp, (0, 1))(Ax[0], b[0])
+    dAx, db = jax.grad(loss_dense, (0, 1))(Ax[0], b[0])
+
+    print(dAx)
+    print(dAx_sp)
+    np.testing.assert_array_almost_equal(dAx_sp, dAx)
+    np.testing.assert_array_almost_equal(db_sp, db)
+
+    # grad of grad: differentiates the transposed (klu_tsolve) solve as well,
+    # whose jvp binds the sparse coo_mul_vec with swapped indices.
+    def grad_sum_sp(Ax, b):
+        return sum(g.sum() for g in jax.grad(loss_sp, (0, 1))(Ax, b))
+
+    def grad_sum_dense(Ax, b):
+        return sum(g.sum() for g in jax.grad(loss_dense, (0, 1))(Ax, b))
+
+    ddAx_sp, ddb_sp = jax.grad(grad_sum_sp, (0, 1))(Ax[0], b[0])
+    ddAx, ddb = jax.grad(grad_sum_dense, (0, 1))(Ax[0], b[0])
+
+    print(ddAx)
+    print(ddAx_sp)
+    np.testing.assert_array_almost_equal(ddAx_sp, ddAx)
+    np.testing.assert_array_almost_equal(ddb_sp, ddb)
+
+    # forward over forward: the inner jvp binds coo_mul_vec on jvp tracers
+    hess_sp = jax.jacfwd(jax.jacfwd(loss_sp))(Ax[0], b[0])
+    hess = jax.jacfwd(jax.jacfwd(loss_dense))(Ax[0], b[0])
+    np.testing.assert_array_almost_equal(hess_sp, hess)
+
+    # A and b vmapped
+    vloss_sp = jax.vmap(jax.grad(loss_sp, (0, 1)), in_axes=(0, 0))
+    vloss_dense = jax.vmap(jax.grad(loss_dense, (0, 1)), in_axes=(0, 0))
+    dAx_sp, db_sp = vloss_sp(Ax, b)
+    dAx, db = vloss_dense(Ax, b)
+
+    print(dAx[:2])
+    print(dAx_sp[:2])
+    np.testing.assert_array_almost_equal(dAx_sp, dAx)
+    np.testing.assert_array_almost_equal(db_sp, db)
+
+
 def test_solve_c128():
     print("\ntest_solve_c128")
     n_nz = 8
@@ -52,6 +409,35 @@ def test_solve_c128():
     np.testing.assert_array_almost_equal(x_sp, x)
 
 
+def test_solve_c128_grad():
+    print("\ntest_solve_c128_grad")
+    n_nz = 8
+    n_col = 5
+    n_rhs = 1
+    Axkey, Aikey, Ajkey, bkey = jax.random.split(jax.random.PRNGKey(33), 4)
+    Ax_r, Ax_i = jax.random.normal(Axkey, (2, n_nz))
+    Ax = Ax_r + 1j * Ax_i
+    Ai = jax.random.randint(Aikey, (n_nz,), 0, n_col, jnp.int32)
+    Aj = jax.random.randint(Ajkey, (n_nz,), 0, n_col, jnp.int32)
+    b_r, b_i = jax.random.normal(bkey, (2, n_col, n_rhs))
+    b = b_r + 1j * b_i
+
+    def loss_sp(Ax, b):
+        return (jnp.abs(klujax.solve(Ai, Aj, Ax, b)) ** 2).sum()
+
+    def loss_dense(Ax, b):
+        A = jnp.zeros((n_col, n_col), dtype=jnp.complex128).at[Ai, Aj].add(Ax)
+        return (jnp.abs(jsp.linalg.solve(A, b)) ** 2).sum()
+
+    dAx_sp, db_sp = jax.grad(loss_sp, (0, 1))(Ax, b)
+    dAx, db = jax.grad(loss_dense, (0, 1))(Ax, b)
+
+    print(dAx)
+    print(dAx_sp)
+    np.testing.assert_array_almost_equal(dAx_sp, dAx)
+    np.testing.assert_array_almost_equal(db_sp, db)
+
+
 def test_solve_f64_vmap():
     print("\ntest_solve_f64_vmap")
     n_lhs = 23
@@ -76,6 +462,14 @@ def test_solve_f64_vmap():
     print(x_sp[:2])
     np.testing.assert_array_almost_equal(x_sp, x)
 
+    # A and b vmapped along different axes
+    vsolve = jax.vmap(klujax.solve, in_axes=(None, None, 1, 0), out_axes=0)
+    x_sp = vsolve(Ai, Aj, Ax.T, b)
+
+    print(x[:2])
+    print(x_sp[:2])
+    np.testing.assert_array_almost_equal(x_sp, x)
+
     # A vmapped
     Axkey, Aikey, Ajkey, bkey = jax.random.split(jax.random.PRNGKey(33), 4)
     Ax = jax.random.normal(Axkey, (n_lhs, n_nz))
@@ -111,6 +505,42 @@ def test_solve_f64_vmap():
     np.testing.assert_array_almost_equal(x_sp, x)
 
 
+def test_solve_f64_vmap_grad():
+    print("\ntest_solve_f64_vmap_grad")
+    n_lhs = 23
+    n_nz = 8
+    n_col = 5
+    n_rhs = 1
+
+    # A vmapped, b shared
+    Axkey, Aikey, Ajkey, bkey = jax.random.split(jax.random.PRNGKey(33), 4)
+    Ax = jax.random.normal(Axkey, (n_lhs, n_nz))
+    Ai = jax.random.randint(Aikey, (n_nz,), 0, n_col, jnp.int32)
+    Aj = jax.random.randint(Ajkey, (n_nz,), 0, n_col, jnp.int32)
+    b = jax.random.normal(bkey, (n_col, n_rhs))
+
+    vsolve = jax.vmap(klujax.solve, in_axes=(None, None, 0, None), out_axes=0)
+
+    def loss_sp(Ax, b):
+        return (vsolve(Ai, Aj, Ax, b) ** 2).sum()
+
+    def loss_dense(Ax, b):
+        A = jnp.zeros((n_lhs, n_col, n_col), dtype=jnp.float64).at[:, Ai, Aj].add(Ax)
+        return (jsp.linalg.solve(A, jnp.broadcast_to(b, (n_lhs, *b.shape))) ** 2).sum()
+
+    dAx_sp, db_sp = jax.grad(loss_sp, (0, 1))(Ax, b)
+    dAx, db = jax.grad(loss_dense, (0, 1))(Ax, b)
+
+    print(db)
+    print(db_sp)
+    np.testing.assert_array_almost_equal(dAx_sp, dAx)
+    np.testing.assert_array_almost_equal(db_sp, db)
+
+    # only w.r.t. b: the tangent of b is solved as a shared b
+    db_sp = jax.grad(loss_sp, 1)(Ax, b)
+    np.testing.assert_array_almost_equal(db_sp, db)
+
+
 def test_solve_c128_vmap():
     print("\ntest_solve_c128_vmap")
     n_lhs = 23
@@ -197,6 +627,64 @@ def test_coo_mul_vec_f64():
     np.testing.assert_array_almost_equal(x_sp, x)
 
 
+def test_coo_mul_vec_f64_low_fill():
+    print("\ntest_coo_mul_vec_f64_low_fill")
+    n_nz = 8
+    n_col = 20  # low fill ratio: uses the sparse kernel
+    n_rhs = 1
+    Axkey, Aikey, Ajkey, bkey = jax.random.split(jax.random.PRNGKey(33), 4)
+    Ax = jax.random.normal(Axkey, (n_nz,))
+    Ai = jax.random.randint(Aikey, (n_nz,), 0, n_col, jnp.int32)
+    Aj = jax.random.randint(Ajkey, (n_nz,), 0, n_col, jnp.int32)
+    b = jax.random.normal(bkey, (n_col, n_rhs))
+    assert n_nz < klujax.DENSE_FILL_THRESHOLD_F64 * n_col * n_col
+
+    x_sp = klujax.coo_mul_vec(Ai, Aj, Ax, b)
+
+    A = jnp.zeros((n_col, n_col), dtype=jnp.float64).at[Ai, Aj].add(Ax)
+    x = A @ b
+
+    print(x)
+    print(x_sp)
+    np.testing.assert_array_almost_equal(x_sp, x)
+
+
+def test_coo_mul_vec_f64_jvp_low_fill():
+    print("\ntest_coo_mul_vec_f64_jvp_low_fill")
+    n_nz = 8
+    n_col = 20  # low fill ratio: uses the sparse kernel
+    n_rhs = 1
+    Axkey, Aikey, Ajkey, bkey, dAxkey, dbkey = jax.random.split(
+        jax.random.PRNGKey(33), 6
+    )
+    Ax = jax.random.normal(Axkey, (n_nz,))
+    Ai = jax.random.randint(Aikey, (n_nz,), 0, n_col, jnp.int32)
+    Aj = jax.random.randint(Ajkey, (n_nz,), 0, n_col, jnp.int32)
+    b = jax.random.normal(bkey, (n_col, n_rhs))
+    dAx = jax.random.normal(dAxkey, (n_nz,))
+    db = jax.random.normal(dbkey, (n_col, n_rhs))
+    assert n_nz < klujax.DENSE_FILL_THRESHOLD_F64 * n_col * n_col
+
+    def mul_sp(Ax, b):
+        return klujax.coo_mul_vec(Ai, Aj, Ax, b)
+
+    def mul_dense(Ax, b):
+        A = jnp.zeros((n_col, n_col), dtype=jnp.float64).at[Ai, Aj].add(Ax)
+        return A @ b
+
+    _, dx_sp = jax.jvp(mul_sp, (Ax, b), (dAx, db))
+    _, dx = jax.jvp(mul_dense, (Ax, b), (dAx, db))
+
+    print(dx)
+    print(dx_sp)
+    np.testing.assert_array_almost_equal(dx_sp, dx)
+
+    # tangent w.r.t. Ax only
+    _, dx_sp = jax.jvp(lambda Ax: mul_sp(Ax, b), (Ax,), (dAx,))
+    _, dx = jax.jvp(lambda Ax: mul_dense(Ax, b), (Ax,), (dAx,))
+    np.testing.assert_array_almost_equal(dx_sp, dx)
+
+
 def test_coo_mul_vec_c128():
     print("\ntest_coo_mul_vec_c128")
     n_nz = 8
@@ -220,6 +708,30 @@ def test_coo_mul_vec_c128():
     np.testing.assert_array_almost_equal(x_sp, x)
 
 
+def test_coo_mul_vec_c128_low_fill():
+    print("\ntest_coo_mul_vec_c128_low_fill")
+    n_nz = 8
+    n_col = 20  # low fill ratio: uses the sparse kernel
+    n_rhs = 1
+    Axkey, Aikey, Ajkey, bkey = jax.random.split(jax.random.PRNGKey(33), 4)
+    Ax = jax.random.normal(Axkey, (2, n_nz))
+    Ax = Ax[0] + 1j * Ax[1]
+    Ai = jax.random.randint(Aikey, (n_nz,), 0, n_col, jnp.int32)
+    Aj = jax.random.randint(Ajkey, (n_nz,), 0, n_col, jnp.int32)
+    b = jax.random.normal(bkey, (2, n_col, n_rhs))
+    b = b[0] + 1j * b[1]
+    assert n_nz < klujax.DENSE_FILL_THRESHOLD_C128 * n_col * n_col
+
+    x_sp = klujax.coo_mul_vec(Ai, Aj, Ax, b)
+
+    A = jnp.zeros((n_col, n_col), dtype=jnp.complex128).at[Ai, Aj].add(Ax)
+    x = A @ b
+
+    print(x)
+    print(x_sp)
+    np.testing.assert_array_almost_equal(x_sp, x)
+
+
 def test_coo_mul_vec_f64_vmap():
     print("\ntest_coo_mul_vec_f64_vmap")
     n_lhs = 23
@@ -340,12 +852,70 @@ def test_coo_mul_vec_c128_vmap():
     np.testing.assert_array_almost_equal(x_sp, x)
 
 
+def test_coo_mul_vec_vmap_low_fill():
+    print("\ntest_coo_mul_vec_vmap_low_fill")
+    n_lhs = 23
+    n_nz = 8
+    n_col = 20  # low fill ratio: uses the sparse kernels
+    n_rhs = 1
+    Axkey, Aikey, Ajkey, bkey = jax.random.split(jax.random.PRNGKey(33), 4)
+    Ai = jax.random.randint(Aikey, (n_nz,), 0, n_col, jnp.int32)
+    Aj = jax.random.randint(Ajkey, (n_nz,), 0, n_col, jnp.int32)
+    assert n_nz < klujax.DENSE_FILL_THRESHOLD_C128 * n_col * n_col
+
+    for dtype in [jnp.float64, jnp.complex128]:
+        Ax = jax.random.normal(Axkey, (2, n_lhs, n_nz))
+        b = jax.random.normal(bkey, (2, n_lhs, n_col, n_rhs))
+        if dtype == jnp.complex128:
+            Ax, b = Ax[0] + 1j * Ax[1], b[0] + 1j * b[1]
+        else:
+            Ax, b = Ax[0], b[0]
+        A = jnp.zeros((n_lhs, n_col, n_col), dtype=dtype).at[:, Ai, Aj].add(Ax)
+
+        # A and b vmapped
+        vmul = jax.vmap(klujax.coo_mul_vec, in_axes=(None, None, 0, 0), out_axes=0)
+        x_sp = vmul(Ai, Aj, Ax, b)
+        x = jnp.einsum("bij,bjk->bik", A, b)
+        np.testing.assert_array_almost_equal(x_sp, x)
+
+        # A vmapped (b is shared by all matrices in the batch)
+        vmul = jax.vmap(klujax.coo_mul_vec, in_axes=(None, None, 0, None), out_axes=0)
+        x_sp = vmul(Ai, Aj, Ax, b[0])
+        x = jnp.einsum("bij,jk->bik", A, b[0])
+        np.testing.assert_array_almost_equal(x_sp, x)
+
+        # b vmapped
+        vmul = jax.vmap(klujax.coo_mul_vec, in_axes=(None, None, None, 0), out_axes=0)
+        x_sp = vmul(Ai, Aj, Ax[0], b)
+        x = jnp.einsum("ij,bjk->bik", A[0], b)
+
+        print(x[:2])
+        print(x_sp[:2])
+        np.testing.assert_array_almost_equal(x_sp, x)
+
+
 if __name__ == "__main__":
     test_solve_f64()
+    test_solve_batched_f64()
+    test_solve_f64_pattern()
+    test_solve_f64_symbolic_cache()
+    test_solve_csc_f64()
+    test_solve_csc_f64_grad()
+    test_solve_csc_c128_vmap()
+    test_coo_to_csc_i32()
+    test_solve_f64_jvp()
+    test_solve_f64_grad()
+    test_solve_f64_grad_low_fill()
     test_solve_c128()
+    test_solve_c128_grad()
     test_solve_f64_vmap()
+    test_solve_f64_vmap_grad()
     test_solve_c128_vmap()
     test_coo_mul_vec_f64()
+    test_coo_mul_vec_f64_low_fill()
+    test_coo_mul_vec_f64_jvp_low_fill()
     test_coo_mul_vec_c128()
+    test_coo_mul_vec_c128_low_fill()
     test_coo_mul_vec_f64_vmap()
     test_coo_mul_vec_c128_vmap()
+    test_coo_mul_vec_vmap_low_fill()